@@ -32,20 +32,29 @@ To Do:
 
 from __future__ import annotations
 
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from datetime import UTC, date, datetime, timedelta
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from time import strptime
-from typing import Any, Protocol
+from typing import TYPE_CHECKING, Any, Protocol
 from uuid import UUID
 import os
+import re
 
-from attrs import field, frozen
+from attrs import define, field, frozen
 from PIL import ExifTags, Image
 from rpds import HashTrieMap
 import rich_click as click
 
 from photography._media import Media, Photo, Video
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from concurrent.futures import Executor
+
 DESKTOP = (
     Path(os.environ["XDG_DESKTOP_DIR"])
     if "XDG_DESKTOP_DIR" in os.environ
@@ -69,6 +78,16 @@ EARLIEST_YEAR = 1989
 
 NOW = datetime.now(UTC)
 
+#: How many files we decide on at once. Deciding is mostly spent waiting on
+#: the filesystem (or on `ffprobe`), so this is more threads than cores.
+WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+#: Filename prefixes which are followed by a YYYYMMDD date (and then time).
+_DATED_PREFIXES = frozenset({"PXL", "IMG", "VID"})
+_DATE_SEPARATORS = ("_", "-")
+#: The same, for when the date isn't simply 8 digits.
+_DATED_STEM = re.compile(r"(?:PXL|IMG|VID)[_-]([^_-]*)[_-](.*)", re.DOTALL)
+
 
 @frozen
 class WTF(Exception):
@@ -95,11 +114,64 @@ def symlink(media: Path, to: Path):
     to.symlink_to(media)
 
 
-def move(media: Path, to: Path):
-    to.parent.mkdir(parents=True, exist_ok=True)
-    if to.exists():
+def move(media: Path, to: Path, destinations: Destinations):
+    destinations.ensure_directory(to.parent)
+    if to in destinations:
         raise RuntimeError(to)
-    media.rename(to)
+    # n.b. not Path.rename, which builds (and discards) a new Path each time
+    os.rename(media, to)  # noqa: PTH104
+    destinations.add(to)
+
+
+@define
+class Destinations:
+    """
+    The files already present in the directories we're moving media into.
+
+    Bursts of photos from the same day all land in the same library directory
+    (and everything we trash lands in the same trash directory), so we list
+    each destination directory once, lazily, and keep the listing up to date
+    as we move files in, rather than checking each individual target.
+
+    Names are compared casefolded, as the filesystems photos live on (macOS,
+    SD cards) are usually case-insensitive, so on them e.g. ``PXL_1.JPG``
+    would clobber ``PXL_1.jpg``. On a case-sensitive filesystem this errs
+    toward refusing a move which would have been safe.
+    """
+
+    _listings: dict[Path, set[str]] = field(
+        factory=dict[Path, set[str]],
+        repr=False,
+    )
+    _ensured: set[Path] = field(factory=set[Path], repr=False)
+
+    def __contains__(self, path: Path) -> bool:
+        return path.name.casefold() in self._listing(path.parent)
+
+    def add(self, path: Path) -> None:
+        """
+        Record that we've put a file at the given path.
+        """
+        self._listing(path.parent).add(path.name.casefold())
+
+    def ensure_directory(self, directory: Path) -> None:
+        """
+        Create a destination directory, unless we already have in this run.
+        """
+        if directory not in self._ensured:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._ensured.add(directory)
+
+    def _listing(self, directory: Path) -> set[str]:
+        listing: set[str] | None = self._listings.get(directory)
+        if listing is None:
+            try:
+                with os.scandir(directory) as entries:
+                    listing = {each.name.casefold() for each in entries}
+            except FileNotFoundError:
+                listing = set[str]()
+            self._listings[directory] = listing
+        return listing
 
 
 @main.command()
@@ -133,29 +205,22 @@ def cull(new_media: Path, library: Path, quarantine: Path):
 
     trash = quarantine.joinpath("trash")
     trash.mkdir(parents=True)
-
-    for directory, _, files in new_media.walk():
-        for file in files:
-            path = directory / file
-            effect = decide(path=path)
-
-            move_to = effect.will_move_to(
-                source=path.relative_to(new_media),
-                library=library,
-                quarantine=quarantine,
-            )
-            if move_to.is_relative_to(trash):
-                if move_to.exists():
-                    raise WTF(
-                        path=move_to,
-                        description="Somehow already exists!",
-                    )
-                click.echo(f"{path} -> {move_to}")
-                path.rename(move_to)
-
-    if list(trash.iterdir()) == []:
+    destinations = Destinations()
+
+    for path, move_to in plan(new_media, library, quarantine):
+        if move_to.is_relative_to(trash):
+            if move_to in destinations:
+                raise WTF(
+                    path=move_to,
+                    description="Somehow already exists!",
+                )
+            click.echo(f"{path} -> {move_to}")
+            os.rename(path, move_to)  # noqa: PTH104
+            destinations.add(move_to)
+
+    if _is_empty(trash):
         trash.rmdir()
-        if list(quarantine.iterdir()) == []:
+        if _is_empty(quarantine):
             quarantine.rmdir()
 
 
@@ -171,19 +236,144 @@ def import_(new_media: Path, library: Path, quarantine: Path) -> None:
     if quarantine.exists():
         raise click.BadParameter(f"{quarantine} already exists!")
 
-    for directory, _, files in new_media.walk():
-        for file in files:
-            path = directory / file
-            effect = decide(path=path)
-            move_to = effect.will_move_to(
-                source=path.relative_to(new_media),
-                library=library,
-                quarantine=quarantine,
-            )
-            move(media=path, to=move_to)
+    destinations = Destinations()
+    for path, move_to in plan(new_media, library, quarantine):
+        move(media=path, to=move_to, destinations=destinations)
+
+
+def plan(
+    new_media: Path,
+    library: Path,
+    quarantine: Path,
+) -> Iterator[tuple[Path, Path]]:
+    """
+    Decide where each new photo/video will be moved to.
+
+    Nothing is moved (that's up to the caller), and decisions are made (and
+    yielded) a directory at a time as we're iterated over, rather than all
+    up front, so callers can start moving things right away without us
+    holding onto a decision for every file.
+    """
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for siblings in walk(new_media):
+            for path, effect in decide_all(siblings=siblings, pool=pool):
+                move_to = effect.will_move_to(
+                    source=path.relative_to(new_media),
+                    library=library,
+                    quarantine=quarantine,
+                )
+                yield path, move_to
+
+
+@frozen
+class Siblings:
+    """
+    The files which live alongside some new media.
+
+    Deciding what to do with a file often means looking at its neighbors
+    (its RAW, the original of a tilde-suffixed copy, etc.), so we list each
+    directory once and answer those questions from the listing rather than
+    re-globbing the directory for every file in it.
+    """
+
+    directory: Path
+    _entries: dict[str, os.DirEntry[str]] = field(alias="entries", repr=False)
+    _names: tuple[str, ...] = field(alias="names", repr=False)
+
+    @classmethod
+    def of(
+        cls,
+        directory: Path,
+        entries: Iterable[os.DirEntry[str]] | None = None,
+    ):
+        """
+        Index the files from a directory's entries (or by listing it).
+        """
+        if entries is None:
+            with os.scandir(directory) as listing:
+                entries = list(listing)
+        files = {
+            each.name: each
+            for each in entries
+            if not each.is_dir(follow_symlinks=False)
+        }
+        return cls(
+            directory=directory,
+            entries=files,
+            names=tuple(sorted(files)),
+        )
+
+    def __iter__(self) -> Iterator[Path]:
+        return (self.directory / name for name in self._names)
 
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
 
-def decide(path: Path) -> Effect:
+    def starting_with(
+        self,
+        prefix: str,
+        suffix: str = "",
+        limit: int | None = None,
+    ) -> list[Path]:
+        """
+        The files whose names start (and optionally end) with the given text.
+
+        Stop after finding ``limit`` of them, if given.
+        """
+        start = bisect_left(self._names, prefix)
+        matches: list[Path] = []
+        for name in islice(self._names, start, None):
+            if not name.startswith(prefix) or len(matches) == limit:
+                break
+            if name.endswith(suffix):
+                matches.append(self.directory / name)
+        return matches
+
+    def stat(self, path: Path) -> os.stat_result:
+        """
+        Stat one of these files, reusing what listing the directory told us.
+        """
+        entry = self._entries.get(path.name)
+        return path.stat() if entry is None else entry.stat()
+
+
+def walk(top: Path) -> Iterator[Siblings]:
+    """
+    Walk a directory of new media (top-down), indexing each directory in it.
+
+    This is `Path.walk`, but keeping the `os.DirEntry` objects it throws away,
+    which carry file types (and, on some platforms, stat results) for free.
+    """
+    directories = [top]
+    while directories:
+        directory = directories.pop()
+        with os.scandir(directory) as listing:
+            entries = list(listing)
+        yield Siblings.of(directory, entries=entries)
+        directories.extend(
+            Path(each.path)
+            for each in reversed(entries)
+            if each.is_dir(follow_symlinks=False)
+        )
+
+
+def decide_all(
+    siblings: Siblings,
+    pool: Executor,
+) -> list[tuple[Path, Effect]]:
+    """
+    Decide on every file in a directory, concurrently.
+
+    Deciding has no side effects, so this is safe, but we finish deciding on
+    the whole directory before returning so that nothing gets moved out from
+    under a decision still looking at its siblings.
+    """
+    paths = list(siblings)
+    effects = pool.map(partial(decide, siblings=siblings), paths)
+    return list(zip(paths, effects))
+
+
+def decide(path: Path, siblings: Siblings | None = None) -> Effect:
     """
     Decide what we want to do with files in this directory.
 
@@ -209,28 +399,36 @@ def decide(path: Path) -> Effect:
         * `ConfirmTrash`: we think we don't need this but are being cautious,
                           so it will be quarantined to confirm
     """
-    if path.name == ".DS_Store":
+    name = path.name
+    if name == ".DS_Store":
         return Trash()
 
-    if path.name.startswith("."):
+    if name.startswith("."):
         return ConfirmTrash()
 
+    if siblings is None:
+        siblings = Siblings.of(path.parent)
+
     # Undocumented Pixel Camera behavior to make `~2.jpg` images occasionally.
     stem, _, tilde = path.stem.rpartition("~")
     if tilde.isdigit():
         original = path.parent.joinpath(stem + path.suffix)
-        if original.is_file():
+        if original.name in siblings:
             return Duplicated(better=original)
 
         # PXL_FOO.RAW-01.MP.COVER~2.jpg -> PXL_FOO.RAW-02.ORIGINAL.dng
         real_stem, _, _ = stem.rpartition(".RAW-")
-        glob = list(path.parent.glob(real_stem + ".RAW-*.dng"))
-        if len(glob) == 1:
-            return Duplicated(better=glob[0])
+        raws = siblings.starting_with(
+            real_stem + ".RAW-",
+            suffix=".dng",
+            limit=2,  # all we care about is whether there's exactly one
+        )
+        if len(raws) == 1:
+            return Duplicated(better=raws[0])
 
         raise WTF(
             path,
-            f"{path.name} looks like a tilde-suffixed Google Camera "
+            f"{name} looks like a tilde-suffixed Google Camera "
             f"file, but {original} doesn't exist alongside it. "
             "Perhaps we should quarantine these files for manual "
             "inspection to decide if they should be imported as "
@@ -240,15 +438,16 @@ def decide(path: Path) -> Effect:
 
     # Similar for other Pixel processed files like long exposure which get
     # named like PXL_20240108_043740102.LONG_EXPOSURE-01.COVER.jpg
-    original = path.parent / path.name.replace("01.COVER", "02.ORIGINAL")
-    if original != path and original.is_file():
-        return Duplicated(better=original)
+    if "01.COVER" in name:
+        original = path.parent / name.replace("01.COVER", "02.ORIGINAL")
+        if original.name in siblings:
+            return Duplicated(better=original)
 
     match path.suffix:
         case ".mp4" | ".mov":
             media = Video.from_path(path)
         case ".jpg" | ".jpeg":
-            raw_path = raw_for(path)
+            raw_path = raw_for(path, siblings=siblings)
             if raw_path is not None:
                 with Image.open(raw_path) as raw, Image.open(path) as jpg:
                     jpg_gps = jpg.getexif().get_ifd(ExifTags.Base.GPSInfo)
@@ -274,7 +473,11 @@ def decide(path: Path) -> Effect:
         case extension:
             raise WTF(path, f"We haven't yet handled {extension} files.")
 
-    return Import.if_dates_match(path=path, media=media)
+    return Import.if_dates_match(
+        path=path,
+        media=media,
+        stat=siblings.stat(path),
+    )
 
 
 class Effect(Protocol):
@@ -402,20 +605,46 @@ def datetime_from(maybe_ymd: str, maybe_time_and_rest: str) -> datetime | None:
     """
     Parse a datetime out of the PXL_-style file format's date/time components.
     """
-    maybe_time, _, _ = maybe_time_and_rest.partition(".")
     try:
-        struct = strptime(f"{maybe_ymd}_{maybe_time}", "%Y%m%d_%H%M%S%f")
+        from_path = _parse_ymd(maybe_ymd)
     except ValueError:
-        try:
-            struct = strptime(maybe_ymd, "%Y%m%d")
-        except ValueError:
-            return
+        return
+
+    # HHMMSS, optionally followed by (ignored) fractional seconds
+    maybe_time, _, _ = maybe_time_and_rest.partition(".")
+    if 6 <= len(maybe_time) <= 12 and _is_digits(maybe_time):  # noqa: PLR2004
+        with suppress(ValueError):
+            from_path = from_path.replace(
+                hour=int(maybe_time[0:2]),
+                minute=int(maybe_time[2:4]),
+                second=int(maybe_time[4:6]),
+            )
 
-    from_path = datetime(*struct[0:6], tzinfo=UTC)
     if from_path.year >= EARLIEST_YEAR and from_path <= NOW:
         return from_path
 
 
+@lru_cache(maxsize=4096)
+def _parse_ymd(ymd: str) -> datetime:
+    """
+    Parse a YYYYMMDD date, which whole bursts of photos will share.
+
+    We do this by hand rather than via `strptime`, which re-parses its format
+    (under a lock) on every call.
+    """
+    if len(ymd) != 8 or not _is_digits(ymd):  # noqa: PLR2004
+        raise ValueError(ymd)
+    return datetime(int(ymd[0:4]), int(ymd[4:6]), int(ymd[6:8]), tzinfo=UTC)
+
+
+@lru_cache(maxsize=4096)
+def _day_directory(year: int, month: int, day: int) -> str:
+    """
+    The library's (relative) directory for photos from the given day.
+    """
+    return f"{year:04}/{month:02}/{day:02}"
+
+
 @frozen
 class Import:
     """
@@ -429,13 +658,20 @@ class Import:
     date: date
 
     @classmethod
-    def if_dates_match(cls, path: Path, media: Media) -> Import | ManualImport:
+    def if_dates_match(
+        cls,
+        path: Path,
+        media: Media,
+        stat: os.stat_result | None = None,
+    ) -> Import | ManualImport:
         """
         Import if the `mtime`, file path and metadata dates match.
 
         Otherwise (or if all 3 seem wrong) manually import.
         """
-        from_mtime = datetime.fromtimestamp(path.stat().st_mtime, tz=UTC)
+        if stat is None:
+            stat = path.stat()
+        from_mtime = datetime.fromtimestamp(stat.st_mtime, tz=UTC)
         # if the mtime is in the past few days (or in the future), ignore it
         # as probably we have media whose mtime has been lost and set to when
         # we copied the files from whatever broken filesystem they came from
@@ -444,14 +680,23 @@ class Import:
 
         from_path = None
 
-        match path.stem.replace("-", "_").split("_", 2):
-            case ["PXL" | "IMG" | "VID", ymd, rest]:
-                from_path = datetime_from(ymd, rest)
-            case _ if path.stem[0].isdigit() or _is_uuid(path.stem):
-                return ManualImport()
-            case _:
-                # TODO: There's more cases we should handle here, e.g. for DSC.
-                raise WTF(path, "Implement me for other prefixes!")
+        # Fast path for the overwhelmingly common PXL_YYYYMMDD_... case,
+        # which avoids the replace + split below for every file.
+        stem = path.stem
+        if (
+            stem[:3] in _DATED_PREFIXES
+            and stem[3:4] in _DATE_SEPARATORS
+            and stem[12:13] in _DATE_SEPARATORS
+            and _is_digits(stem[4:12])
+        ):
+            from_path = datetime_from(stem[4:12], stem[13:])
+        elif dated := _DATED_STEM.match(stem):
+            from_path = datetime_from(*dated.groups())
+        elif stem[0].isdigit() or _is_uuid(stem):
+            return ManualImport()
+        else:
+            # TODO: There's more cases we should handle here, e.g. for DSC.
+            raise WTF(path, "Implement me for other prefixes!")
 
         from_metadata = media.metadata_datetime
 
@@ -483,22 +728,27 @@ class Import:
                 raise WTF(path, "No dates??")
 
     def will_move_to(self, source: Path, library: Path, quarantine: Path):
-        target = library / self.date.strftime("%Y/%m/%d") / source.name
-        assert not target.exists(), (source, target)  # noqa: S101
-        return target
+        # n.b. move() is what guards against clobbering an existing file, from
+        #      a listing of the directory rather than a stat per target
+        day = _day_directory(self.date.year, self.date.month, self.date.day)
+        return library / day / source.name
 
 
-def raw_for(path: Path) -> Path | None:
+def raw_for(path: Path, siblings: Siblings | None = None) -> Path | None:
     """
     Find the raw file for this (JPEG) image.
 
     So only call me with JPEGs.
     """
-    if path.suffix not in {".jpg", ".jpeg"}:
+    if not path.name.endswith((".jpg", ".jpeg")):
         raise WTF(path, "We're looking for the RAW file for a non-JPEG!")
 
+    if siblings is None:
+        siblings = Siblings.of(path.parent)
+
     superstem, _, _ = path.name.partition(".")
-    match list(path.parent.glob(f"{superstem}*.dng")):  # TODO: other RAW exts
+    # TODO: other RAW exts
+    match siblings.starting_with(superstem, suffix=".dng"):
         case []:
             return
         case [raw]:
@@ -511,6 +761,15 @@ def raw_for(path: Path) -> Path | None:
             )
 
 
+def _is_empty(directory: Path) -> bool:
+    with os.scandir(directory) as entries:
+        return next(entries, None) is None
+
+
+def _is_digits(s: str) -> bool:
+    return s.isascii() and s.isdigit()
+
+
 def _is_uuid(s: str) -> bool:
     try:
         UUID(s)
@@ -6,18 +6,36 @@ Media type specific behavior.
 
 from __future__ import annotations
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
 from functools import cached_property
-from typing import TYPE_CHECKING, Any, Protocol
+from threading import BoundedSemaphore
+from typing import TYPE_CHECKING, BinaryIO, Protocol, cast
+import os
 import subprocess
 
 from attrs import frozen
 from PIL import ExifTags, Image
 import imagehash
+import numpy as np
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
     from pathlib import Path
 
+    from numpy.typing import NDArray
+
+#: Videos whose creation time we can read straight out of their `moov` atom.
+_MP4_SUFFIXES = frozenset({".mp4", ".mov", ".m4v"})
+#: QuickTime (and so MP4) timestamps are seconds since 1904.
+_MP4_EPOCH = datetime(1904, 1, 1, tzinfo=UTC)
+_UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+#: How many ``ffprobe`` processes we run at once, however many threads (e.g.
+#: those deciding on a directory of new media) want one. Each only reads
+#: metadata, so we also keep it to one thread of its own.
+_FFPROBES = BoundedSemaphore(min(8, os.cpu_count() or 1))
+
 
 class Media(Protocol):
     """
@@ -40,22 +58,138 @@ class Photo:
     A photo.
     """
 
-    _exif: dict[ExifTags, Any]
-    #: `imagehash` doesn't cover videos and it's not often I have a cropped or
-    #: modified video which isn't otherwise easy to identify via e.g. tilde
-    #: naming, but maybe at some point we'll want some video hash
-    hash: imagehash.ImageHash
+    _path: Path
+    #: The only bit of EXIF we currently care about, so the only one we keep.
+    metadata_datetime: datetime | None
 
     @cached_property
-    def metadata_datetime(self) -> datetime | None:
-        exif_date = self._exif.get(ExifTags.Base.DateTimeOriginal)
-        if exif_date is not None:
-            return datetime.fromisoformat(exif_date)
+    def hash(self) -> imagehash.ImageHash:
+        """
+        A perceptual hash of the photo.
+
+        It's computed only when asked for, as it means decoding the whole
+        image, which simply reading its metadata does not.
+
+        `imagehash` doesn't cover videos and it's not often I have a cropped
+        or modified video which isn't otherwise easy to identify via e.g.
+        tilde naming, but maybe at some point we'll want some video hash.
+        """
+        return _phash(self._path)
 
     @classmethod
     def from_path(cls, path: Path):
-        with Image.open(path) as image:
-            return cls(exif=image.getexif(), hash=imagehash.phash(image))
+        exif = _jpeg_exif(path)
+        if exif is None:
+            with Image.open(path) as image:
+                exif = image.getexif()
+        exif_date = exif.get(ExifTags.Base.DateTimeOriginal)
+        return cls(
+            path=path,
+            metadata_datetime=(
+                None
+                if exif_date is None
+                else datetime.fromisoformat(exif_date)
+            ),
+        )
+
+
+def _jpeg_exif(path: Path) -> Image.Exif | None:
+    """
+    Read a JPEG's EXIF straight out of its APP1 segment(s).
+
+    This skips everything else `Image.open` does to set up decoding an image
+    (parsing quantization and Huffman tables, ICC profiles, etc.) when all we
+    want is its metadata.
+
+    Returns ``None`` for anything which doesn't look like a (well-formed)
+    JPEG, so that the caller can fall back to asking PIL.
+    """
+    data = b""
+    with path.open("rb") as file:
+        if file.read(2) != b"\xff\xd8":
+            return
+        while True:
+            if file.read(1) != b"\xff":
+                return
+            marker = file.read(1)
+            while marker == b"\xff":  # fill bytes
+                marker = file.read(1)
+            if not marker:
+                return
+            if marker in b"\xd9\xda":  # end of image, or start of scan
+                break
+            if marker in b"\x01\xd0\xd1\xd2\xd3\xd4\xd5\xd6\xd7":
+                continue  # standalone markers, which have no length
+            length = int.from_bytes(file.read(2))
+            if length < 2:  # noqa: PLR2004
+                return
+            segment = file.read(length - 2)
+            if marker == b"\xe1" and segment.startswith(b"Exif\0\0"):
+                # EXIF spread across multiple segments is concatenated, as PIL
+                # does, by stripping the repeated header
+                data += segment[6:] if data else segment
+
+    exif = Image.Exif()
+    if data:
+        exif.load(data)
+    return exif
+
+
+def phashes(paths: Iterable[Path]) -> list[imagehash.ImageHash]:
+    """
+    Perceptually hash many photos at once.
+
+    These are the same hashes as `Photo.hash`, but rather than paying
+    NumPy's per-call overhead once per photo, we decode the photos in a
+    thread pool and then take all of their DCTs in one go.
+    """
+    with ThreadPoolExecutor() as pool:
+        return _phash_thumbnails(list(pool.map(_thumbnail, paths)))
+
+
+def _phash(path: Path) -> imagehash.ImageHash:
+    """
+    Perceptually hash a single image.
+    """
+    [hash] = _phash_thumbnails([_thumbnail(path)])
+    return hash
+
+
+def _phash_thumbnails(
+    thumbnails: list[NDArray[np.float64]],
+) -> list[imagehash.ImageHash]:
+    """
+    Compute what `imagehash.phash` does, but for a whole batch of thumbnails.
+    """
+    if not thumbnails:
+        return []
+
+    # Like imagehash, only pay for importing SciPy (which is slow to import)
+    # when we actually need it.
+    import scipy.fft  # noqa: PLC0415  # pyright: ignore[reportMissingTypeStubs]
+
+    # n.b. the default (unnormalized) DCT here is the same as imagehash's via
+    #      scipy.fftpack, which is what makes our hashes identical to its
+    dcts = cast(
+        "NDArray[np.float64]",
+        scipy.fft.dctn(np.stack(thumbnails), axes=(-2, -1)),  # pyright: ignore[reportUnknownMemberType]
+    )[:, :8, :8]
+    medians = np.median(dcts.reshape(len(dcts), -1), axis=1)
+    return [
+        imagehash.ImageHash(low > median) for low, median in zip(dcts, medians)
+    ]
+
+
+def _thumbnail(path: Path) -> NDArray[np.float64]:
+    """
+    Decode an image into the 32x32 grayscale pixels we perceptually hash.
+
+    This is exactly what `imagehash.phash` does, so that our hashes are the
+    same as its hashes (which matters once they're persisted anywhere).
+    """
+    with Image.open(path) as image:
+        small = image.convert("L").resize((32, 32), Image.Resampling.LANCZOS)
+    return np.asarray(small, dtype=np.float64)
 
 
 @frozen
@@ -69,21 +203,92 @@ class Video:
 
     @classmethod
     def from_path(cls, path: Path):
-        stdout = subprocess.check_output(  # noqa: S603
-            [  # noqa: S607
-                "ffprobe",
-                "-v",
-                "quiet",
-                "-show_entries",
-                "format_tags=creation_time",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                path,
-            ],
-            text=True,
-        )
+        if path.suffix.lower() in _MP4_SUFFIXES:
+            creation_time = _mp4_creation_time(path)
+            if creation_time is not None:
+                return cls(metadata_datetime=creation_time)
+
+        with _FFPROBES:
+            stdout = subprocess.check_output(  # noqa: S603
+                [  # noqa: S607
+                    "ffprobe",
+                    "-v",
+                    "quiet",
+                    "-threads",
+                    "1",
+                    "-show_entries",
+                    "format_tags=creation_time",
+                    "-of",
+                    "default=noprint_wrappers=1:nokey=1",
+                    path,
+                ],
+                stdin=subprocess.DEVNULL,
+                text=True,
+            )
         return cls(
             metadata_datetime=(
                 datetime.fromisoformat(stdout.strip()) if stdout else None
             ),
         )
+
+
+def _mp4_creation_time(path: Path) -> datetime | None:
+    """
+    Read an MP4 / QuickTime video's creation time from its movie header.
+
+    This is the same (container-level) ``creation_time`` which ``ffprobe``
+    reports, without spawning it.
+
+    Returns ``None`` if we don't find one, so the caller can fall back to
+    asking ``ffprobe``.
+    """
+    with path.open("rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        for kind, start, end in _atoms(file, end=size):
+            if kind != b"moov":
+                continue
+            file.seek(start)
+            for kind, start, _ in _atoms(file, end=end):
+                if kind != b"mvhd":
+                    continue
+                file.seek(start)
+                version = file.read(4)[:1]  # then 3 bytes of flags
+                width = 8 if version == b"\x01" else 4
+                raw = file.read(width)
+                seconds = int.from_bytes(raw)
+                if len(raw) != width or not seconds:
+                    return
+                try:
+                    created = _MP4_EPOCH + timedelta(seconds=seconds)
+                except OverflowError:  # garbage, which ffprobe would skip
+                    return
+                # Like ffmpeg, tolerate writers which wrongly used Unix time.
+                if created < _UNIX_EPOCH:
+                    created = _UNIX_EPOCH + timedelta(seconds=seconds)
+                return created
+            return
+
+
+def _atoms(file: BinaryIO, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """
+    The (type, payload start, payload end) of each atom from here until end.
+    """
+    position = file.tell()
+    while position + 8 <= end:
+        file.seek(position)
+        header = file.read(8)
+        if len(header) < 8:  # noqa: PLR2004
+            return
+        size, kind, start = (
+            int.from_bytes(header[:4]),
+            header[4:],
+            position + 8,
+        )
+        if size == 1:  # a 64-bit size follows
+            size, start = int.from_bytes(file.read(8)), start + 8
+        elif size == 0:  # extends to the end
+            size = end - position
+        if position + size < start or position + size > end:
+            return
+        yield kind, start, position + size
+        position += size
@@ -0,0 +1,228 @@
+from datetime import UTC, datetime
+from pathlib import Path
+from uuid import uuid4
+import os
+
+import pytest
+
+from photography._cli import (
+    WTF,
+    Destinations,
+    Import,
+    ManualImport,
+    Siblings,
+    datetime_from,
+    move,
+    walk,
+)
+
+
+def test_move_refuses_to_clobber(tmp_path: Path):
+    (tmp_path / "library").mkdir()
+    (tmp_path / "library" / "PXL_1.jpg").write_text("existing")
+    new = tmp_path / "PXL_1.jpg"
+    new.write_text("new")
+
+    with pytest.raises(RuntimeError):
+        move(new, tmp_path / "library" / new.name, Destinations())
+    assert (tmp_path / "library" / "PXL_1.jpg").read_text() == "existing"
+
+
+def test_move_refuses_to_clobber_differing_only_in_case(tmp_path: Path):
+    (tmp_path / "library").mkdir()
+    (tmp_path / "library" / "PXL_1.jpg").write_text("existing")
+    new = tmp_path / "PXL_1.JPG"
+    new.write_text("new")
+
+    with pytest.raises(RuntimeError):
+        move(new, tmp_path / "library" / new.name, Destinations())
+    assert new.read_text() == "new"
+
+
+def test_move_remembers_what_it_moved(tmp_path: Path):
+    destinations = Destinations()
+    first, second = tmp_path / "a" / "PXL_1.jpg", tmp_path / "b" / "PXL_1.JPG"
+    for each in first, second:
+        each.parent.mkdir()
+        each.write_text(each.parent.name)
+
+    move(first, tmp_path / "library" / first.name, destinations)
+    with pytest.raises(RuntimeError):
+        move(second, tmp_path / "library" / second.name, destinations)
+    assert (tmp_path / "library" / "PXL_1.jpg").read_text() == "a"
+
+
+@pytest.mark.parametrize(
+    "ymd, rest, expected",
+    [
+        pytest.param(
+            "20240108",
+            "043740102.jpg",
+            datetime(2024, 1, 8, 4, 37, 40, tzinfo=UTC),
+            id="HHMMSSmmm",
+        ),
+        pytest.param(
+            "20240111",
+            "233000",
+            datetime(2024, 1, 11, 23, 30, tzinfo=UTC),
+            id="HHMMSS",
+        ),
+        pytest.param(
+            "20240108",
+            "WA0001",
+            datetime(2024, 1, 8, tzinfo=UTC),
+            id="no-time",
+        ),
+        pytest.param("2024018", "043740", None, id="7-digit-date"),
+        pytest.param("20241308", "043740", None, id="invalid-month"),
+        pytest.param("19880101", "043740", None, id="before-earliest-year"),
+        pytest.param("29990101", "043740", None, id="future"),
+    ],
+)
+def test_datetime_from(ymd: str, rest: str, expected: datetime | None):
+    assert datetime_from(ymd, rest) == expected
+
+
+class NoMetadata:
+    metadata_datetime = None
+    hash = None
+
+
+def media_at(tmp_path: Path, name: str, mtime: datetime) -> Path:
+    path = tmp_path / name
+    path.touch()
+    os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+    return path
+
+
+@pytest.mark.parametrize(
+    "name, mtime, expected",
+    [
+        pytest.param(
+            "PXL_20240108_043740102.jpg",
+            datetime(2024, 1, 8, 4, 37, 40, tzinfo=UTC),
+            Import(date=datetime(2024, 1, 8, 4, 37, 40, tzinfo=UTC)),
+            id="PXL",
+        ),
+        pytest.param(
+            "IMG_20240111_233000.jpg",
+            datetime(2024, 1, 11, 23, 30, tzinfo=UTC),
+            Import(date=datetime(2024, 1, 11, 23, 30, tzinfo=UTC)),
+            id="IMG-HHMMSS",
+        ),
+        pytest.param(
+            "IMG-20240108-WA0001.jpg",
+            datetime(2024, 1, 8, 12, tzinfo=UTC),
+            Import(date=datetime(2024, 1, 8, tzinfo=UTC)),
+            id="IMG-WhatsApp",
+        ),
+        pytest.param(
+            "VID_2024018_1.mp4",
+            datetime(2024, 1, 5, tzinfo=UTC),
+            Import(date=datetime(2024, 1, 5, tzinfo=UTC)),
+            id="7-digit-date-ignored",
+        ),
+    ],
+)
+def test_if_dates_match(
+    tmp_path: Path,
+    name: str,
+    mtime: datetime,
+    expected: Import,
+):
+    path = media_at(tmp_path, name, mtime)
+    assert Import.if_dates_match(path=path, media=NoMetadata()) == expected
+
+
+def test_if_dates_match_discrepant_time(tmp_path: Path):
+    mtime = datetime(2024, 1, 10, 23, tzinfo=UTC)
+    path = media_at(tmp_path, "IMG_20240111_233000.jpg", mtime)
+    effect = Import.if_dates_match(path=path, media=NoMetadata())
+    assert isinstance(effect, ManualImport)
+
+
+@pytest.mark.parametrize("stem", ["20240108_1", str(uuid4())])
+def test_if_dates_match_unknown_format(tmp_path: Path, stem: str):
+    mtime = datetime(2024, 1, 8, tzinfo=UTC)
+    path = media_at(tmp_path, f"{stem}.jpg", mtime)
+    effect = Import.if_dates_match(path=path, media=NoMetadata())
+    assert effect == ManualImport()
+
+
+@pytest.mark.parametrize("name", ["DSC_0001.jpg", "PXLX_20240108_1.jpg"])
+def test_if_dates_match_unhandled_prefix(tmp_path: Path, name: str):
+    path = media_at(tmp_path, name, datetime(2024, 1, 8, tzinfo=UTC))
+    with pytest.raises(WTF):
+        Import.if_dates_match(path=path, media=NoMetadata())
+
+
+def test_siblings_starting_with(tmp_path: Path):
+    for name in ["IMG_1.jpg", "IMG_1.dng", "IMG_12.jpg", "IMG_2.jpg", "1.jpg"]:
+        (tmp_path / name).touch()
+    siblings = Siblings.of(tmp_path)
+
+    assert siblings.starting_with("IMG_1") == [
+        tmp_path / "IMG_1.dng",
+        tmp_path / "IMG_1.jpg",
+        tmp_path / "IMG_12.jpg",
+    ]
+    assert siblings.starting_with("IMG_1", suffix=".jpg") == [
+        tmp_path / "IMG_1.jpg",
+        tmp_path / "IMG_12.jpg",
+    ]
+    assert siblings.starting_with("IMG_1", limit=1) == [
+        tmp_path / "IMG_1.dng",
+    ]
+    assert siblings.starting_with("IMG_3") == []
+
+
+def test_siblings_starting_with_glob_metacharacters(tmp_path: Path):
+    """
+    Names are matched literally, unlike the globs this replaced.
+    """
+    for name in ["IMG[1].jpg", "IMG[1]~1.jpg", "IMG1.jpg"]:
+        (tmp_path / name).touch()
+    siblings = Siblings.of(tmp_path)
+
+    assert siblings.starting_with("IMG[1]") == [
+        tmp_path / "IMG[1].jpg",
+        tmp_path / "IMG[1]~1.jpg",
+    ]
+    assert siblings.starting_with("IMG[1]", suffix="~1.jpg") == [
+        tmp_path / "IMG[1]~1.jpg",
+    ]
+
+
+def test_siblings_exclude_directories(tmp_path: Path):
+    (tmp_path / "IMG_1.jpg").touch()
+    (tmp_path / "IMG_1").mkdir()
+    siblings = Siblings.of(tmp_path)
+
+    assert "IMG_1.jpg" in siblings
+    assert "IMG_1" not in siblings
+    assert list(siblings) == [tmp_path / "IMG_1.jpg"]
+    assert siblings.starting_with("IMG_1") == [tmp_path / "IMG_1.jpg"]
+
+
+def test_walk(tmp_path: Path):
+    (tmp_path / "b" / "c").mkdir(parents=True)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "z.jpg").touch()
+    (tmp_path / "y.jpg").touch()
+    (tmp_path / "a" / "2.jpg").touch()
+    (tmp_path / "a" / "1.jpg").touch()
+    (tmp_path / "b" / "c" / "3.jpg").touch()
+
+    walked = {each.directory: list(each) for each in walk(tmp_path)}
+
+    directories = list(walked)
+    assert directories[0] == tmp_path
+    assert directories.index(tmp_path / "b") < directories.index(
+        tmp_path / "b" / "c",
+    )
+    assert walked == {
+        tmp_path: [tmp_path / "y.jpg", tmp_path / "z.jpg"],
+        tmp_path / "a": [tmp_path / "a" / "1.jpg", tmp_path / "a" / "2.jpg"],
+        tmp_path / "b": [],
+        tmp_path / "b" / "c": [tmp_path / "b" / "c" / "3.jpg"],
+    }
@@ -0,0 +1,239 @@
+from datetime import UTC, datetime
+from pathlib import Path
+import struct
+
+from PIL import ExifTags, Image
+import imagehash
+import numpy as np
+import pytest
+
+from photography._media import Photo, _jpeg_exif, _mp4_creation_time, phashes
+
+CREATED = datetime(2024, 1, 8, 4, 37, 40, tzinfo=UTC)
+#: CREATED, as seconds since 1904 (the MP4 epoch)
+MP4_SECONDS = 2082844800 + int(CREATED.timestamp())
+
+
+def atom(kind: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+
+def mvhd(seconds: int, version: int = 0) -> bytes:
+    width = ">Q" if version == 1 else ">I"
+    times = struct.pack(width, seconds) + struct.pack(width, seconds)
+    return atom(b"mvhd", bytes([version, 0, 0, 0]) + times + b"\0" * 88)
+
+
+def mp4(*atoms: bytes) -> bytes:
+    return (
+        atom(b"ftyp", b"isom\0\0\0\0")
+        + atom(b"mdat", b"x" * 100)
+        + b"".join(
+            atoms,
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "contents, expected",
+    [
+        pytest.param(mp4(atom(b"moov", mvhd(MP4_SECONDS))), CREATED, id="v0"),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(MP4_SECONDS, version=1))),
+            CREATED,
+            id="v1",
+        ),
+        pytest.param(
+            mp4(atom(b"moov", atom(b"udta") + mvhd(MP4_SECONDS))),
+            CREATED,
+            id="mvhd-not-first",
+        ),
+        pytest.param(
+            atom(b"ftyp", b"isom")
+            + struct.pack(">I", 1)
+            + b"mdat"
+            + struct.pack(">Q", 16 + 5)
+            + b"hello"
+            + atom(b"moov", mvhd(MP4_SECONDS)),
+            CREATED,
+            id="64-bit-atom-size",
+        ),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(2082844800))),
+            datetime(1970, 1, 1, tzinfo=UTC),
+            id="1904-epoch-boundary",
+        ),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(1))),
+            datetime(1970, 1, 1, 0, 0, 1, tzinfo=UTC),
+            id="pre-1970-read-as-unix-time-like-ffmpeg",
+        ),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(int(CREATED.timestamp())))),
+            CREATED,
+            id="unix-epoch-writer",
+        ),
+        pytest.param(mp4(atom(b"moov", mvhd(0))), None, id="zero"),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(2**62, version=1))),
+            None,
+            id="overflow",
+        ),
+        pytest.param(mp4(atom(b"moov")), None, id="no-mvhd"),
+        pytest.param(mp4(), None, id="no-moov"),
+        pytest.param(
+            atom(b"ftyp", b"isom") + struct.pack(">I", 9999) + b"mdat",
+            None,
+            id="truncated-atom",
+        ),
+        pytest.param(
+            mp4(atom(b"moov", mvhd(MP4_SECONDS)))[:-100],
+            None,
+            id="truncated-mvhd",
+        ),
+        pytest.param(b"", None, id="empty"),
+    ],
+)
+def test_mp4_creation_time(tmp_path: Path, contents: bytes, expected):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(contents)
+    assert _mp4_creation_time(path) == expected
+
+
+def jpeg(path: Path, exif: Image.Exif | None = None) -> bytes:
+    image = Image.new("RGB", (16, 16), (10, 200, 30))
+    if exif is None:
+        image.save(path)
+    else:
+        image.save(path, exif=exif)
+    return path.read_bytes()
+
+
+def some_exif() -> Image.Exif:
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "Google"
+    exif[ExifTags.Base.ImageDescription] = "a long description " * 20
+    exif[ExifTags.Base.DateTimeOriginal] = "2024-01-08T04:37:40"
+    return exif
+
+
+def pil_exif(path: Path) -> dict[int, object]:
+    with Image.open(path) as image:
+        return dict(image.getexif())
+
+
+def app1(payload: bytes) -> bytes:
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def app1_bounds(contents: bytes) -> tuple[int, int]:
+    """
+    Where the (first) APP1 segment's payload starts and ends.
+    """
+    marker = contents.index(b"\xff\xe1")
+    (length,) = struct.unpack(">H", contents[marker + 2 : marker + 4])
+    return marker + 4, marker + 2 + length
+
+
+def test_jpeg_exif(tmp_path: Path):
+    path = tmp_path / "photo.jpg"
+    jpeg(path, exif=some_exif())
+    exif = _jpeg_exif(path)
+    assert exif is not None
+    assert dict(exif) == pil_exif(path)
+    assert exif[ExifTags.Base.Make] == "Google"
+
+
+def test_jpeg_exif_no_exif(tmp_path: Path):
+    path = tmp_path / "photo.jpg"
+    jpeg(path)
+    exif = _jpeg_exif(path)
+    assert exif is not None
+    assert dict(exif) == pil_exif(path) == {}
+
+
+def test_jpeg_exif_split_across_segments(tmp_path: Path):
+    contents = jpeg(tmp_path / "whole.jpg", exif=some_exif())
+    start, end = app1_bounds(contents)
+    before, payload, after = (
+        contents[:start],
+        contents[start:end],
+        contents[end:],
+    )
+    assert payload.startswith(b"Exif\0\0")
+
+    half = len(payload) // 2
+    path = tmp_path / "split.jpg"
+    path.write_bytes(
+        before[:-4]  # the original APP1 marker and length
+        + app1(payload[:half])
+        + app1(b"Exif\0\0" + payload[half:])
+        + after,
+    )
+    exif = _jpeg_exif(path)
+    assert exif is not None
+    assert dict(exif) == pil_exif(path) == pil_exif(tmp_path / "whole.jpg")
+
+
+def test_jpeg_exif_fill_bytes(tmp_path: Path):
+    contents = jpeg(tmp_path / "whole.jpg", exif=some_exif())
+    _, end = app1_bounds(contents)
+    path = tmp_path / "filled.jpg"
+    path.write_bytes(contents[:end] + b"\xff\xff\xff" + contents[end:])
+    exif = _jpeg_exif(path)
+    assert exif is not None
+    assert dict(exif) == pil_exif(path) == pil_exif(tmp_path / "whole.jpg")
+
+
+def test_jpeg_exif_truncated(tmp_path: Path):
+    contents = jpeg(tmp_path / "whole.jpg", exif=some_exif())
+    path = tmp_path / "truncated.jpg"
+    _, end = app1_bounds(contents)
+    path.write_bytes(contents[: end - 10])
+    assert _jpeg_exif(path) is None
+
+
+def test_jpeg_exif_not_a_jpeg_falls_back_to_pil(tmp_path: Path):
+    path = tmp_path / "photo.dng"  # a DNG is a TIFF
+    Image.new("RGB", (16, 16)).save(path, format="TIFF", exif=some_exif())
+    assert _jpeg_exif(path) is None
+    photo = Photo.from_path(path)
+    assert photo.metadata_datetime is not None
+    assert photo.metadata_datetime.isoformat() == "2024-01-08T04:37:40"
+
+
+def generated_images(tmp_path: Path) -> list[Path]:
+    rng = np.random.default_rng(0)
+    paths: list[Path] = []
+    for i, (mode, size) in enumerate(
+        [
+            ("RGB", (64, 48)),
+            ("L", (31, 97)),
+            ("RGBA", (200, 150)),
+            ("P", (40, 40)),
+            ("RGB", (7, 5)),
+        ],
+    ):
+        width, height = size
+        shape = (height, width, 3) if mode != "L" else (height, width)
+        pixels = rng.integers(0, 256, shape, dtype=np.uint8)
+        image = Image.fromarray(pixels).convert(mode)
+        path = tmp_path / f"{i}.png"
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def test_hashes_match_imagehash(tmp_path: Path):
+    paths = generated_images(tmp_path)
+    expected: list[imagehash.ImageHash] = []
+    for path in paths:
+        with Image.open(path) as image:
+            expected.append(imagehash.phash(image))
+
+    assert [Photo.from_path(path).hash for path in paths] == expected
+    assert phashes(paths) == expected
+
+
+def test_phashes_empty():
+    assert phashes([]) == []